@@ -0,0 +1,98 @@
+# benchmark.py
+"""
+Benchmark suite. Each benchmark runs in a fresh subprocess so import time
+and peak RSS are measured in isolation.
+
+    python benchmark.py embeddings [--backends onnx onnx-int8] [--threads 4]
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_TEXTS = [
+    "Large language model agents for software engineering",
+    "Enhancement in reliability of IEEE 802.15.4 WBAN using greedy spider monkey algorithm",
+    "Resource management in fog computing using greedy and semi-greedy spider monkey optimization",
+    "Predicting mortality rate and associated risks in COVID-19 patients",
+]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def bench_embedding_backend(backend, threads=0, queries=50, batch_size=256):
+    """Load time, single-query latency, batch throughput and RSS for one backend."""
+    start = time.perf_counter()
+    from embeddings import get_embedding_function
+    ef = get_embedding_function(backend, threads=threads)
+    ef(BENCH_TEXTS[:1])  # first call downloads / quantizes / warms the model
+    load_s = time.perf_counter() - start
+
+    latencies = []
+    for i in range(queries):
+        t = time.perf_counter()
+        ef([BENCH_TEXTS[i % len(BENCH_TEXTS)]])
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    batch = [BENCH_TEXTS[i % len(BENCH_TEXTS)] + f" {i}" for i in range(batch_size)]
+    t = time.perf_counter()
+    ef(batch)
+    batch_s = time.perf_counter() - t
+
+    return {
+        "benchmark": "embeddings",
+        "backend": backend,
+        "threads": threads,
+        "load_s": round(load_s, 2),
+        "latency_ms_p50": round(statistics.median(latencies), 2),
+        "latency_ms_p95": round(percentile(latencies, 95), 2),
+        "throughput_docs_s": round(batch_size / batch_s, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(args):
+    """Run `benchmark.py <args> --worker` in a subprocess and parse its JSON line."""
+    proc = subprocess.run(
+        [sys.executable, __file__, *args, "--worker"], capture_output=True, text=True
+    )
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        return {"args": args, "error": (proc.stderr or "no output").strip().splitlines()[-1:]}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Research assistant benchmarks.")
+    sub = parser.add_subparsers(dest="suite", required=True)
+    emb = sub.add_parser("embeddings", help="Embedding backend latency / throughput / RSS")
+    emb.add_argument("--backends", nargs="+", default=None, help="Default: all backends")
+    emb.add_argument("--threads", type=int, default=0)
+    emb.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.suite == "embeddings":
+        if args.worker:
+            print(json.dumps(bench_embedding_backend(args.backends[0], threads=args.threads)))
+            return
+        # Imported here (not at top) so worker subprocesses time their own imports
+        from embeddings import EMBEDDING_BACKENDS
+        for backend in args.backends or EMBEDDING_BACKENDS:
+            result = run_isolated(["embeddings", "--backends", backend, "--threads", str(args.threads)])
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# budget.py
+"""
+Per-run latency budget for run_research_pipeline. Tracks time spent per
+stage, predicts whether another stage fits in the remaining time and
+records every shortcut taken so it can be reported with the result.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+RESEARCH_BUDGET_S = float(os.getenv("RESEARCH_BUDGET_S", "120"))
+
+# Prior stage durations (seconds) used until a stage has been observed in this run
+STAGE_ESTIMATES_S = {
+    "memory": 1.0,
+    "keywords": 2.0,
+    "openalex": 3.0,
+    "critic": 8.0,
+    "citations": 5.0,
+    "scribe": 30.0,
+    "scribe_fast": 10.0,
+}
+
+
+class RunBudget:
+    def __init__(self, budget_s=RESEARCH_BUDGET_S):
+        self.budget_s = budget_s
+        self.start = time.perf_counter()
+        self.stages = {}  # name -> {"calls": n, "seconds": total}
+        self.shortcuts = []
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        return self.budget_s - self.elapsed()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block under a stage name (accumulates across retries)."""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += time.perf_counter() - t
+
+    def estimate(self, name):
+        """Observed mean duration of a stage, or its prior."""
+        entry = self.stages.get(name)
+        if entry and entry["calls"]:
+            return entry["seconds"] / entry["calls"]
+        return STAGE_ESTIMATES_S.get(name, 0.0)
+
+    def fits(self, *names, reserve=0.0):
+        """True if the named stages (plus reserve seconds) fit in the remaining budget."""
+        return sum(self.estimate(n) for n in names) + reserve <= self.remaining()
+
+    def shortcut(self, note):
+        print(f"⏱️ Shortcut: {note}")
+        self.shortcuts.append(note)
+
+    def summary_markdown(self):
+        lines = [
+            "### ⏱️ Run Budget",
+            f"- **Elapsed:** {self.elapsed():.1f}s of {self.budget_s:.0f}s budget",
+        ]
+        for name, entry in self.stages.items():
+            lines.append(f"- **{name}:** {entry['seconds']:.1f}s over {entry['calls']} call(s)")
+        if self.shortcuts:
+            lines.append("- **Shortcuts taken:**")
+            lines += [f"  - {note}" for note in self.shortcuts]
+        else:
+            lines.append("- **Shortcuts taken:** none")
+        return "\n".join(lines)
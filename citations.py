@@ -0,0 +1,206 @@
+# citations.py
+"""
+Citation-graph expansion for approved papers. Looks up key references
+(referenced_works) and citing works (cites:) in batched OpenAlex requests
+instead of one request per work, skips works already in research_db and
+upserts the rest through save_papers_to_memory.
+"""
+import logging
+import os
+import re
+import requests
+from dotenv import load_dotenv
+from memory import save_papers_to_memory, find_known_works
+from tools import abstract_from_inverted_index
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPENALEX_WORKS_URL = "https://api.openalex.org/works"
+# OpenAlex accepts up to 100 pipe-joined values in one OR filter
+OPENALEX_MAX_IDS_PER_CALL = 100
+OPENALEX_MAX_PER_PAGE = 200
+WORK_FIELDS = "id,doi,title,publication_year,authorships,abstract_inverted_index"
+
+# How many references / citing works to keep per approved paper
+MAX_REFERENCES_PER_PAPER = 5
+MAX_CITING_PER_PAPER = 5
+# Pages of a batched cites: query to walk before giving up on filling every seed's quota
+MAX_CITING_PAGES = 3
+
+# Pull key references / citing works of approved papers into memory
+EXPAND_CITATIONS = os.getenv("EXPAND_CITATIONS", "0") == "1"
+
+# Balanced "(...)" groups are part of the link, e.g. 10.1016/S0140-6736(20)30183-5
+_LINK_PATTERN = re.compile(
+    r"https?://(?:dx\.)?(?:doi\.org|openalex\.org)/(?:[^\s|()\[\]<>\"']|\([^\s|()<>\"']*\))+"
+)
+
+HEADERS = {"User-Agent": "AI-Researcher/1.0 (mailto:your_email@example.com)"}
+
+
+def short_openalex_id(value):
+    """'https://openalex.org/W123' -> 'W123'; returns None for non-OpenAlex values."""
+    value = (value or "").strip()
+    tail = value.rstrip("/").rsplit("/", 1)[-1]
+    return tail if tail[:1] == "W" and tail[1:].isdigit() else None
+
+
+def extract_links(text):
+    """DOI / OpenAlex links in agent output (e.g. the Critic's approved list)."""
+    return [l.rstrip(".,;") for l in dict.fromkeys(_LINK_PATTERN.findall(text or ""))]
+
+
+def _batches(items, size=OPENALEX_MAX_IDS_PER_CALL):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class _Client:
+    """Thin OpenAlex client that counts HTTP requests."""
+
+    def __init__(self):
+        self.requests = 0
+        self.api_key = os.getenv("OPENALEX_API_KEY")
+
+    def works_page(self, filter_expr, select, per_page=OPENALEX_MAX_PER_PAGE, sort=None, cursor=None):
+        """One request; returns (results, next_cursor)."""
+        params = {"filter": filter_expr, "select": select, "per-page": per_page}
+        if sort:
+            params["sort"] = sort
+        if cursor:
+            params["cursor"] = cursor
+        if self.api_key:
+            params["mailto"] = self.api_key
+        self.requests += 1
+        response = requests.get(OPENALEX_WORKS_URL, params=params, headers=HEADERS, timeout=15)
+        response.raise_for_status()
+        data = response.json()
+        return data.get("results", []), (data.get("meta") or {}).get("next_cursor")
+
+    def works(self, filter_expr, select, per_page=OPENALEX_MAX_PER_PAGE, sort=None):
+        return self.works_page(filter_expr, select, per_page=per_page, sort=sort)[0]
+
+    def citing_works(self, seed_ids, max_per_seed, cited_by_count=None):
+        """
+        Most-cited works citing each seed, at most max_per_seed per seed, from
+        one batched cites: OR filter. Each result's referenced_works tells
+        which seeds it cites; pages are walked until every quota is filled.
+        A seed's quota is capped at its cited_by_count so rarely cited seeds
+        don't force extra pages.
+        """
+        cited_by_count = cited_by_count or {}
+        quota = {s: min(max_per_seed, cited_by_count.get(s, max_per_seed)) for s in seed_ids}
+        quota = {s: q for s, q in quota.items() if q > 0}
+        selected, cursor = [], "*"
+        for _ in range(MAX_CITING_PAGES if quota else 0):
+            results, cursor = self.works_page(
+                "cites:" + "|".join(quota), WORK_FIELDS + ",referenced_works",
+                sort="cited_by_count:desc", cursor=cursor,
+            )
+            for work in results:
+                cited = [s for s in map(short_openalex_id, work.get("referenced_works") or [])
+                         if quota.get(s, 0) > 0]
+                if cited:
+                    selected.append(work)
+                    for s in cited:
+                        quota[s] -= 1
+            if not cursor or not results or not any(quota.values()):
+                break
+        return selected
+
+
+def _to_paper(work):
+    authorships = work.get("authorships") or []
+    first = authorships[0] if authorships else {}
+    return {
+        "title": work.get("title") or "Unknown Title",
+        "year": str(work.get("publication_year", "N/A")),
+        "author": (first.get("author") or {}).get("display_name", "") or "",
+        "link": work.get("doi") or work.get("id"),
+        "abstract": abstract_from_inverted_index(work.get("abstract_inverted_index") or {}),
+        "openalex_id": work.get("id") or "",
+    }
+
+
+def _resolve_seeds(client, links):
+    """Fetch id, referenced_works and cited_by_count for approved papers (DOI or OpenAlex links)."""
+    select = "id,doi,referenced_works,cited_by_count"
+    ids = [i for i in (short_openalex_id(l) for l in links) if i]
+    dois = [l for l in links if "doi.org/" in l]
+    seeds = []
+    for batch in _batches(ids):
+        seeds += client.works("openalex:" + "|".join(batch), select)
+    for batch in _batches(dois):
+        seeds += client.works("doi:" + "|".join(batch), select)
+    return seeds
+
+
+def expand_citations(approved_papers, topic,
+                     max_references=MAX_REFERENCES_PER_PAPER,
+                     max_citing=MAX_CITING_PER_PAPER):
+    """
+    Expands approved papers (dicts with "openalex_id" / "link", or plain link strings) with
+    their key references and citing works, saved to memory under topic.
+    Returns: {"expanded": N, "saved": M, "skipped_known": K,
+              "requests": R, "requests_per_paper": R / N}
+    """
+    links = [
+        (p.get("openalex_id") or p.get("link") or p.get("doi") or "") if isinstance(p, dict) else str(p)
+        for p in approved_papers or []
+    ]
+    links = [l.strip() for l in dict.fromkeys(links) if l and l.strip()]
+    stats = {"expanded": 0, "saved": 0, "skipped_known": 0, "requests": 0, "requests_per_paper": 0.0}
+    if not links:
+        return stats
+
+    client = _Client()
+    try:
+        seeds = _resolve_seeds(client, links)
+        seed_ids = [short_openalex_id(s.get("id")) for s in seeds]
+        seed_ids = [i for i in seed_ids if i]
+        stats["expanded"] = len(seed_ids)
+
+        # Key references: first N referenced_works per seed, minus seeds and known works
+        ref_urls = []
+        for seed in seeds:
+            ref_urls += (seed.get("referenced_works") or [])[:max_references]
+        ref_urls = [u for u in dict.fromkeys(ref_urls) if short_openalex_id(u) not in seed_ids]
+        known = find_known_works(ref_urls)
+        stats["skipped_known"] += len(known)
+        ref_ids = [short_openalex_id(u) for u in ref_urls if u not in known]
+
+        works = []
+        for batch in _batches([i for i in ref_ids if i]):
+            works += client.works("openalex:" + "|".join(batch), WORK_FIELDS, per_page=len(batch))
+
+        # Citing works: one cites: OR filter per batch of seeds, capped per seed
+        if max_citing > 0:
+            cited_by_count = {
+                short_openalex_id(s.get("id")): s["cited_by_count"]
+                for s in seeds if s.get("cited_by_count") is not None
+            }
+            for batch in _batches(seed_ids):
+                works += client.citing_works(batch, max_citing, cited_by_count)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Citation expansion failed: {e}")
+        works = []
+
+    papers = list({p["openalex_id"]: p for p in map(_to_paper, works)}.values())
+    known = find_known_works([p["openalex_id"] for p in papers] + [p["link"] for p in papers])
+    new_papers = [p for p in papers if p["openalex_id"] not in known and p["link"] not in known]
+    stats["skipped_known"] += len(papers) - len(new_papers)
+
+    if new_papers:
+        save_papers_to_memory(new_papers, topic)
+    stats["saved"] = len(new_papers)
+    stats["requests"] = client.requests
+    if stats["expanded"]:
+        stats["requests_per_paper"] = round(client.requests / stats["expanded"], 2)
+    print(
+        f"🔗 Citation expansion: {stats['expanded']} papers → {stats['saved']} new works "
+        f"({stats['skipped_known']} already in memory), "
+        f"{stats['requests']} requests ({stats['requests_per_paper']} per paper)"
+    )
+    return stats
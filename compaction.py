@@ -0,0 +1,188 @@
+# compaction.py
+"""
+Token-budgeted context compaction of paper abstracts.
+Abstracts are trimmed to their most topic-relevant sentences (ranked locally
+with the same MiniLM embeddings as memory.py) so the whole paper context
+fits into a per-run token budget. main.py compacts the Scribe's input; the
+crew compacts the search-tool output before the Critic. The crew Scribe's
+context (the Critic's approved list, which carries no abstracts) is not
+budgeted.
+"""
+import logging
+import os
+import re
+import numpy as np
+from memory import local_ef
+from source_tracker import append_event
+
+logger = logging.getLogger(__name__)
+
+# Per-run token budget for the paper context handed to the Scribe
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Below this many tokens a trimmed abstract is useless, so it is dropped instead
+MIN_ABSTRACT_TOKENS = 40
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_ABSTRACT_LINE = re.compile(r"^(Abstract:[ \t]*)(.+)$", re.MULTILINE)
+_NOT_PROVIDED = "(not provided)"
+# Marker for abstracts dropped to fit the budget. Deliberately not "(not provided)",
+# which tasks.yaml tells the Critic to review more leniently.
+_TRIMMED = "(trimmed for length)"
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional; fall back to a chars/4 estimate
+    _encoding = None
+
+
+def estimate_tokens(text):
+    """Token count for text (tiktoken when installed, else ~4 chars per token)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def rank_sentences(topic, sentences):
+    """Return sentence indices ordered by cosine similarity to the topic."""
+    try:
+        embs = np.array(local_ef([topic] + sentences), dtype=float)
+        q, s = embs[0], embs[1:]
+        sims = s @ q / (np.linalg.norm(s, axis=1) * np.linalg.norm(q) + 1e-9)
+        return [int(i) for i in np.argsort(-sims)]
+    except Exception as e:
+        logger.warning(f"Sentence ranking failed, keeping leading sentences: {e}")
+        return list(range(len(sentences)))
+
+
+def _hard_cut(text, max_tokens):
+    """Truncate text (plus an ellipsis) to at most max_tokens."""
+    cut = text[: max_tokens * 4].rstrip()
+    while cut and estimate_tokens(cut + " …") > max_tokens:
+        cut = cut[: int(len(cut) * 0.9)].rstrip()
+    return cut + " …" if cut else ""
+
+
+def compact_abstract(topic, abstract, max_tokens):
+    """
+    Keep the most topic-relevant sentences (in original order) within max_tokens.
+    Returns "" when the abstract does not fit and max_tokens is below MIN_ABSTRACT_TOKENS.
+    """
+    abstract = (abstract or "").strip()
+    if not abstract or abstract == _NOT_PROVIDED or estimate_tokens(abstract) <= max_tokens:
+        return abstract
+    if max_tokens < MIN_ABSTRACT_TOKENS:
+        return ""
+    sentences = [s for s in _SENTENCE_SPLIT.split(abstract) if s.strip()]
+    if len(sentences) <= 1:
+        # Single run-on sentence: hard cut at the budget
+        return _hard_cut(abstract, max_tokens)
+
+    keep, used = [], 0
+    for i in rank_sentences(topic, sentences):
+        cost = estimate_tokens(sentences[i])
+        if used + cost > max_tokens:
+            continue
+        keep.append(i)
+        used += cost
+    if not keep:
+        return _hard_cut(sentences[0], max_tokens)
+    return " ".join(sentences[i] for i in sorted(keep))
+
+
+def _allocate(topic, abstracts, budget):
+    """
+    Split the abstract budget across papers: short abstracts keep everything,
+    leftover budget flows to the longer ones, and abstracts are dropped once
+    the budget is used up. Returns compacted abstracts.
+    """
+    out = list(abstracts)
+    order = sorted(range(len(abstracts)), key=lambda i: estimate_tokens(abstracts[i]))
+    remaining = max(budget, 0)
+    for n, i in enumerate(order):
+        share = max(remaining // (len(order) - n), 0)
+        out[i] = compact_abstract(topic, abstracts[i], share)
+        remaining -= estimate_tokens(out[i])
+    return out
+
+
+def _report(label, tokens_in, tokens_out, token_budget):
+    stats = {"tokens_in": tokens_in, "tokens_out": tokens_out}
+    if tokens_in != tokens_out:
+        print(f"✂️ Compacted {label}: {tokens_in} → {tokens_out} tokens")
+        logger.info(f"Compacted {label}: {tokens_in} -> {tokens_out} tokens (budget {token_budget})")
+        # [UI HOOK] surfaced in the Gradio source summary
+        append_event(["compaction", f"{tokens_in} → {tokens_out}"])
+    if tokens_out > token_budget:
+        logger.warning(f"{label} still {tokens_out} tokens after dropping abstracts (budget {token_budget})")
+    return stats
+
+
+def _fit(topic, abstracts, abstract_budget, token_budget, build):
+    """
+    Allocate abstract_budget across abstracts and build the result; per-piece
+    token estimates don't add up exactly, so shrink and retry on overshoot.
+    Returns (result, tokens).
+    """
+    for _ in range(3):
+        result, tokens = build(_allocate(topic, abstracts, abstract_budget))
+        if tokens <= token_budget:
+            break
+        abstract_budget -= tokens - token_budget
+    return result, tokens
+
+
+def compact_papers(topic, papers, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Compact a list of paper dicts so their JSON-ish size fits token_budget.
+    Returns (compacted_papers, {"tokens_in": N, "tokens_out": M}).
+    """
+    if not papers:
+        return papers, _report("papers", 0, 0, token_budget)
+    tokens_in = estimate_tokens(str(papers))
+    if tokens_in <= token_budget:
+        return papers, _report("papers", tokens_in, tokens_in, token_budget)
+
+    abstracts = [
+        (p.get("abstract") or "") if isinstance(p, dict) else "" for p in papers
+    ]
+    fixed = tokens_in - sum(estimate_tokens(a) for a in abstracts)
+
+    def build(trimmed):
+        compacted = []
+        for p, a in zip(papers, trimmed):
+            if isinstance(p, dict) and "abstract" in p:
+                p = {**p, "abstract": a}
+            compacted.append(p)
+        return compacted, estimate_tokens(str(compacted))
+
+    compacted, tokens_out = _fit(topic, abstracts, token_budget - fixed, token_budget, build)
+    return compacted, _report("papers", tokens_in, tokens_out, token_budget)
+
+
+def compact_text(topic, text, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Compact tool/agent output that lists papers with "Abstract: ..." lines.
+    Returns (compacted_text, {"tokens_in": N, "tokens_out": M}).
+    """
+    text = text or ""
+    tokens_in = estimate_tokens(text)
+    matches = list(_ABSTRACT_LINE.finditer(text))
+    if tokens_in <= token_budget or not matches:
+        return text, _report("context", tokens_in, tokens_in, token_budget)
+
+    abstracts = [m.group(2) for m in matches]
+    fixed = tokens_in - sum(estimate_tokens(a) for a in abstracts)
+    # Reserve room for the marker of any dropped abstract
+    reserve = len(abstracts) * estimate_tokens(_TRIMMED)
+
+    def build(trimmed):
+        trimmed = iter(trimmed)
+        compacted = _ABSTRACT_LINE.sub(lambda m: m.group(1) + (next(trimmed) or _TRIMMED), text)
+        return compacted, estimate_tokens(compacted)
+
+    compacted, tokens_out = _fit(topic, abstracts, token_budget - fixed - reserve, token_budget, build)
+    return compacted, _report("context", tokens_in, tokens_out, token_budget)
@@ -1,8 +1,18 @@
 # crew.py
+import argparse
 import os
+import statistics
+import threading
+import time
+import uuid
 import yaml
+from contextlib import contextmanager
 from crewai import Agent, Task, Crew, Process, LLM
+import memory
 from tools import search_openalex
+from compaction import compact_text
+from citations import expand_citations, extract_links, EXPAND_CITATIONS
+from singleflight import SingleFlight
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -45,46 +55,130 @@ scribe = Agent(
     allow_delegation=False
 )
 
-# --- TASKS ---
-# We use 'context' to pass data from one task to the next
-research_task = Task(
-    config=tasks_config['research_task'],
-    agent=librarian
-)
+# --- TASKS & CREWS ---
+# Tasks are built per run so each run's compaction callback keeps its own
+# topic (overlapping runs must not share mutable Task objects).
+def compact_tool_output(topic):
+    """Task callback: trims abstracts in the Librarian's output before the Critic sees it."""
+    def callback(output):
+        output.raw, _ = compact_text(topic, output.raw)
+    return callback
 
-review_task = Task(
-    config=tasks_config['review_task'],
-    agent=critic,
-    context=[research_task]  # Critic reviews Librarian's work
-)
 
-synthesis_task = Task(
-    config=tasks_config['synthesis_task'],
-    agent=scribe,
-    context=[review_task],  # Scribe writes based on Critic's review
-    output_file='final_research_report.md'
-)
+def build_research_crew(topic):
+    """Librarian -> Critic -> Scribe, sequential."""
+    # We use 'context' to pass data from one task to the next
+    research_task = Task(
+        config=tasks_config['research_task'],
+        agent=librarian,
+        callback=compact_tool_output(topic)  # Abstracts trimmed to the token budget
+    )
+    # The Scribe's context below is the Critic's approved list (no abstracts)
+    # and is not compacted or budgeted.
+
+    review_task = Task(
+        config=tasks_config['review_task'],
+        agent=critic,
+        context=[research_task]  # Critic reviews Librarian's work
+    )
+
+    synthesis_task = Task(
+        config=tasks_config['synthesis_task'],
+        agent=scribe,
+        context=[review_task],  # Scribe writes based on Critic's review
+        output_file='final_research_report.md'
+    )
+
+    # --- CREW (Sequential) ---
+    return Crew(
+        agents=[librarian, critic, scribe],
+        tasks=[research_task, review_task, synthesis_task],
+        process=Process.sequential,  # Sequential execution
+        verbose=True
+    )
+
+
+def build_direct_crew():
+    """
+    Same sequential Critic -> Scribe flow, without the Librarian hop.
+    The Librarian only forwards {topic} to the tool, so the direct path calls
+    search_openalex itself and hands the tool output to the Critic as {papers}.
+    """
+    direct_review_task = Task(
+        description=tasks_config['review_task']['description'] + (
+            "\n\nLibrarian's output (from the OpenAlex Search tool):\n{papers}"
+        ),
+        expected_output=tasks_config['review_task']['expected_output'],
+        agent=critic
+    )
+
+    direct_synthesis_task = Task(
+        config=tasks_config['synthesis_task'],
+        agent=scribe,
+        context=[direct_review_task],
+        output_file='final_research_report.md'
+    )
+
+    return Crew(
+        agents=[critic, scribe],
+        tasks=[direct_review_task, direct_synthesis_task],
+        process=Process.sequential,
+        verbose=True
+    )
+
+# --- PIPELINE MODES ---
+# "agentic": Librarian agent calls the tool (original behaviour)
+# "direct":  search_openalex is called deterministically, no Librarian LLM round trip
+PIPELINE_MODES = ("agentic", "direct")
+DEFAULT_PIPELINE_MODE = os.getenv("CREW_PIPELINE_MODE", "agentic")
+
+
+def kickoff_direct(topic):
+    """Calls the search tool directly and runs Critic + Scribe on its output."""
+    papers, _ = compact_text(topic, search_openalex.run(topic))
+    return build_direct_crew().kickoff(inputs={'topic': topic, 'papers': papers})
 
-# --- CREW (Sequential) ---
-research_crew = Crew(
-    agents=[librarian, critic, scribe],
-    tasks=[research_task, review_task, synthesis_task],
-    process=Process.sequential,  # Sequential execution
-    verbose=True
-)
 
 # --- MAIN FUNCTION ---
-def run_crew(topic):
+def expand_approved_in_background(result, topic):
+    """
+    Citation expansion for crew runs: pull the links out of the Critic's
+    output (the task before the Scribe's) and expand them on a daemon thread
+    so the report isn't held up. Benefits the next run on this topic.
+    """
+    tasks_output = getattr(result, "tasks_output", None) or []
+    if len(tasks_output) < 2:
+        return None
+    links = extract_links(tasks_output[-2].raw)
+    if not links:
+        return None
+    thread = threading.Thread(target=expand_citations, args=(links, topic), daemon=True)
+    thread.start()
+    return thread
+
+
+def run_crew(topic, mode=None):
     """
     Runs the research crew for a given topic.
+    mode: "agentic" or "direct" (defaults to CREW_PIPELINE_MODE env var).
     Returns the final report as a string.
     """
-    print(f"🚀 Starting Sequential Research on: {topic}")
+    mode = mode or DEFAULT_PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {mode} (expected one of {PIPELINE_MODES})")
+    print(f"🚀 Starting Sequential Research ({mode}) on: {topic}")
     
+    start = time.perf_counter()
     try:
         # Kickoff the crew with the topic
-        result = research_crew.kickoff(inputs={'topic': topic})
+        if mode == "direct":
+            result = kickoff_direct(topic)
+        else:
+            result = build_research_crew(topic).kickoff(inputs={'topic': topic})
         
+        if EXPAND_CITATIONS:
+            expand_approved_in_background(result, topic)
+
         # CrewAI returns a CrewOutput object, convert to string
         final_output = str(result)
         
@@ -95,13 +189,90 @@ def run_crew(topic):
         error_msg = f"❌ Error during research: {str(e)}"
         print(error_msg)
         return error_msg
+    finally:
+        print(f"⏱️ Pipeline ({mode}) took {time.perf_counter() - start:.2f}s")
+
+
+# Concurrent requests for the same topic share one crew run
+crew_flight = SingleFlight()
+
+
+def run_crew_coalesced(topic, mode=None):
+    """run_crew behind the single-flight layer (see crew_flight.stats())."""
+    mode = mode or DEFAULT_PIPELINE_MODE
+    # Agentic and direct runs produce different reports, so never share across modes
+    return crew_flight.do(topic, lambda: run_crew(topic, mode=mode), scope=mode)
+
+
+@contextmanager
+def cold_memory():
+    """
+    Point memory at a fresh, empty in-memory collection for the duration of
+    the block, so a run can't be served from papers an earlier run cached.
+    research_db itself is left untouched.
+    """
+    import chromadb
+    saved = (memory.collection, memory.MEMORY_SHARDING, memory.MEMORY_READ_BACKEND)
+    memory.collection = chromadb.EphemeralClient().get_or_create_collection(
+        name=f"compare_{uuid.uuid4().hex[:8]}", embedding_function=memory.local_ef
+    )
+    memory.MEMORY_SHARDING, memory.MEMORY_READ_BACKEND = False, "chroma"
+    try:
+        yield
+    finally:
+        memory.collection, memory.MEMORY_SHARDING, memory.MEMORY_READ_BACKEND = saved
+
+
+def compare_pipeline_modes(topic, repeats=5):
+    """
+    Runs the topic through both pipeline modes `repeats` times and returns
+    wall-clock latency per mode: {"median_s", "min_s", "max_s", "stdev_s", "samples"}.
+    Every run starts from an empty memory so none benefits from another's cache,
+    and the mode order alternates per repeat to spread out API drift.
+    """
+    samples = {mode: [] for mode in PIPELINE_MODES}
+    for i in range(repeats):
+        for mode in (PIPELINE_MODES if i % 2 == 0 else PIPELINE_MODES[::-1]):
+            with cold_memory():
+                start = time.perf_counter()
+                run_crew(topic, mode=mode)
+                samples[mode].append(time.perf_counter() - start)
+
+    latencies = {
+        mode: {
+            "median_s": round(statistics.median(xs), 2),
+            "min_s": round(min(xs), 2),
+            "max_s": round(max(xs), 2),
+            "stdev_s": round(statistics.stdev(xs), 2) if len(xs) > 1 else 0.0,
+            "samples": len(xs),
+        }
+        for mode, xs in samples.items()
+    }
+    agentic, direct = latencies["agentic"], latencies["direct"]
+    saved = agentic["median_s"] - direct["median_s"]
+    print(
+        f"⏱️ Latency over {repeats} run(s) — "
+        f"agentic: median {agentic['median_s']}s (range {agentic['min_s']}–{agentic['max_s']}s, sd {agentic['stdev_s']}s), "
+        f"direct: median {direct['median_s']}s (range {direct['min_s']}–{direct['max_s']}s, sd {direct['stdev_s']}s) "
+        f"— median saved {saved:.2f}s"
+    )
+    return latencies
 
 # --- TESTING ---
 if __name__ == "__main__":
     # Only runs when you execute this file directly
-    test_topic = "AI Agents in Software Engineering"
-    result = run_crew(test_topic)
-    print("\n" + "="*50)
-    print("FINAL RESULT:")
-    print("="*50)
-    print(result)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the research crew.")
+    parser.add_argument("topic", nargs="?", default="AI Agents in Software Engineering")
+    parser.add_argument("--mode", choices=PIPELINE_MODES, default=None)
+    parser.add_argument("--compare", action="store_true", help="Run both modes and compare latency")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per mode with --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_pipeline_modes(args.topic, repeats=args.repeats)
+    else:
+        result = run_crew(args.topic, mode=args.mode)
+        print("\n" + "="*50)
+        print("FINAL RESULT:")
+        print("="*50)
+        print(result)
\ No newline at end of file
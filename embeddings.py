@@ -0,0 +1,162 @@
+# embeddings.py
+"""
+Pluggable embedding backends for memory.py. All backends run
+all-MiniLM-L6-v2, so vectors stay compatible with the existing collection:
+  - "sentence-transformers": PyTorch (original behaviour)
+  - "onnx":      ONNX Runtime, fp32, no PyTorch import
+  - "onnx-int8": ONNX Runtime with a dynamically int8-quantized copy of the model
+int8 vectors drift slightly from fp32; check_compatibility() measures the
+drift and migrate_embeddings() re-embeds the collection when it is too large.
+"""
+import json
+import logging
+import os
+from functools import cached_property
+import numpy as np
+from chromadb.utils import embedding_functions
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BACKENDS = ("sentence-transformers", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+# 0 = let the runtime decide
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+# Min cosine similarity between a backend and the fp32 reference to share a collection
+COMPATIBILITY_THRESHOLD = 0.99
+PROBE_TEXTS = [
+    "Large language model agents for software engineering",
+    "Reliability of IEEE 802.15.4 wireless body area networks",
+    "Predicting mortality in COVID-19 patients with machine learning",
+    "Resource management in fog computing using swarm optimization",
+]
+# Sidecar file recording which backend produced the stored vectors
+BACKEND_MARKER = os.path.join("./research_db", "embedding_backend.json")
+
+
+class ONNXMiniLM(embedding_functions.ONNXMiniLM_L6_V2):
+    """Chroma's ONNX MiniLM with thread control and optional int8 quantization."""
+
+    def __init__(self, quantized=False, threads=EMBEDDING_THREADS):
+        super().__init__(preferred_providers=["CPUExecutionProvider"])
+        self.quantized = quantized
+        self.threads = threads
+
+    def _model_path(self):
+        self._download_model_if_not_exists()
+        path = os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx")
+        if not self.quantized:
+            return path
+        int8_path = path.replace("model.onnx", "model.int8.onnx")
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            tmp_path = int8_path + ".tmp"
+            quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+            logger.info(f"Quantized embedding model written to {int8_path}")
+        return int8_path
+
+    @cached_property
+    def model(self):
+        import onnxruntime as ort
+        so = ort.SessionOptions()
+        if self.threads:
+            so.intra_op_num_threads = self.threads
+            so.inter_op_num_threads = 1
+        return ort.InferenceSession(
+            self._model_path(), sess_options=so, providers=["CPUExecutionProvider"]
+        )
+
+
+def get_embedding_function(backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS):
+    """Build the embedding function for a backend name."""
+    if backend == "sentence-transformers":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=MODEL_NAME)
+    if backend == "onnx":
+        return ONNXMiniLM(quantized=False, threads=threads)
+    if backend == "onnx-int8":
+        return ONNXMiniLM(quantized=True, threads=threads)
+    raise ValueError(f"Unknown embedding backend: {backend} (expected one of {EMBEDDING_BACKENDS})")
+
+
+def check_compatibility(ef, reference_ef=None, texts=PROBE_TEXTS):
+    """Min cosine similarity between ef and the fp32 sentence-transformers vectors."""
+    reference_ef = reference_ef or get_embedding_function("sentence-transformers")
+    a = np.array(ef(texts), dtype=float)
+    b = np.array(reference_ef(texts), dtype=float)
+    sims = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-9)
+    return float(sims.min())
+
+
+def read_backend_marker():
+    """Backend that produced the stored vectors (sentence-transformers if never recorded)."""
+    try:
+        with open(BACKEND_MARKER, "r", encoding="utf-8") as f:
+            return json.load(f).get("backend", "sentence-transformers")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return "sentence-transformers"
+
+
+def write_backend_marker(backend):
+    os.makedirs(os.path.dirname(BACKEND_MARKER), exist_ok=True)
+    tmp = BACKEND_MARKER + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"backend": backend}, f)
+    os.replace(tmp, BACKEND_MARKER)
+
+
+def migrate_embeddings(collections, ef, backend, force=False, batch_size=256):
+    """
+    Re-embed every stored document in collections (the main one plus any
+    shards) with ef when it is not compatible with the stored vectors.
+    Returns the number of re-embedded rows.
+    """
+    stored = read_backend_marker()
+    if stored == backend and not force:
+        print(f"🧭 Collection already embedded with {backend}.")
+        return 0
+    if not force:
+        sim = check_compatibility(ef, get_embedding_function(stored))
+        if sim >= COMPATIBILITY_THRESHOLD:
+            print(f"🧭 {backend} is compatible with {stored} (min cosine {sim:.4f}); no re-embed needed.")
+            write_backend_marker(backend)
+            return 0
+        print(f"🧭 {backend} drifts from {stored} (min cosine {sim:.4f}); re-embedding collection...")
+
+    total = 0
+    for collection in collections:
+        data = collection.get(include=["documents", "metadatas"])
+        ids = data.get("ids") or []
+        for i in range(0, len(ids), batch_size):
+            docs = data["documents"][i:i + batch_size]
+            collection.upsert(
+                ids=ids[i:i + batch_size],
+                embeddings=ef(docs),
+                documents=docs,
+                metadatas=data["metadatas"][i:i + batch_size],
+            )
+        total += len(ids)
+    # Marker only moves once every collection holds the new vectors
+    write_backend_marker(backend)
+    print(f"🧭 Re-embedded {total} papers across {len(collections)} collection(s) with {backend}.")
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Switch the memory embedding backend.")
+    parser.add_argument("backend", choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--force", action="store_true", help="Re-embed even if vectors look compatible")
+    args = parser.parse_args()
+
+    from memory import all_collections, MEMORY_SHARDING
+    migrated = migrate_embeddings(
+        all_collections(), get_embedding_function(args.backend), args.backend, force=args.force
+    )
+    if migrated and MEMORY_SHARDING:
+        from sharding import shard_router
+        shard_router.recompute_centroids()
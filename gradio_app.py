@@ -3,7 +3,7 @@ import gradio as gr
 import sys
 import threading
 import time
-from crew import run_crew
+from crew import run_crew_coalesced, crew_flight
 from memory import flush_memory
 
 # --- 1. THE HIDDEN LOGGER ---
@@ -33,6 +33,10 @@ class SourceTracker:
             mem_hits = sum(1 for e in direct_events if e == "mem")
             web_hits = sum(1 for e in direct_events if e == "web")
             openalex_queries = [e[1] for e in direct_events if isinstance(e, list) and len(e) == 2 and e[0] == "openalex_query"]
+        compactions = [e[1] for e in (direct_events or []) if isinstance(e, list) and len(e) == 2 and e[0] == "compaction"]
+        compaction_section = ""
+        if compactions:
+            compaction_section = "\n- **Context compaction (tokens):** " + "; ".join(compactions)
         query_section = ""
         if openalex_queries:
             unique_queries = list(dict.fromkeys(openalex_queries))
@@ -42,15 +46,18 @@ class SourceTracker:
             tool_called = any(isinstance(e, list) and e and e[0] == "tool_called" for e in direct_events)
             if not tool_called:
                 no_tool_note = "\n- ⚠️ No tool calls detected — the Librarian may not have invoked the search."
+        flight = crew_flight.stats()
+        coalesced = flight["coalesced"] + flight["coalesced_near_duplicate"]
         return f"""
         ### 📊 Data Source Summary
         - **Local Memory (ChromaDB):** Used {mem_hits} times (Fast & Free)
         - **External API (OpenAlex):** Used {web_hits} times (Slow & Costly)
-        {query_section}{no_tool_note}
+        - **Coalesced requests:** {coalesced}/{flight["requests"]} ({flight["coalescing_rate"]:.0%}) shared an in-flight run
+        {query_section}{compaction_section}{no_tool_note}
         """
 
 # --- 2. THE RESEARCH FUNCTION ---
-def run_research(topic):
+def run_research(topic, direct=False):
     # Clear events file (works across subprocesses)
     from source_tracker import clear_events, get_events
     clear_events()
@@ -64,7 +71,8 @@ def run_research(topic):
     result_container = {"data": None}
     def target():
         try:
-            result_container["data"] = str(run_crew(topic))
+            mode = "direct" if direct else "agentic"
+            result_container["data"] = str(run_crew_coalesced(topic, mode=mode))
         except Exception as e:
             result_container["data"] = f"Error: {e}"
     
@@ -107,6 +115,7 @@ with gr.Blocks(theme=gr.themes.Soft()) as app:
         msg = gr.Textbox(label="Research Topic", placeholder="e.g. VLA Manufacturing 2026")
         btn = gr.Button("🚀 Run", variant="primary", scale=0)
         flush_btn = gr.Button("🗑️ Flush Memory", variant="secondary")
+        direct = gr.Checkbox(label="⚡ Direct search (skip Librarian)", value=False)
     
     with gr.Row():
         # Simple Status Box
@@ -117,7 +126,7 @@ with gr.Blocks(theme=gr.themes.Soft()) as app:
         output = gr.Markdown(label="Final Research Report")
 
     # Connect buttons
-    btn.click(fn=run_research, inputs=msg, outputs=[status, output])
+    btn.click(fn=run_research, inputs=[msg, direct], outputs=[status, output])
     flush_btn.click(fn=flush_db, inputs=None, outputs=status)
 
 if __name__ == "__main__":
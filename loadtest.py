@@ -0,0 +1,212 @@
+# loadtest.py
+"""
+Load-testing harness for gradio_app. Drives run_research with N concurrent
+simulated sessions against stubbed OpenAlex and LLM backends, so the real
+app code paths (background thread, polling loop, stdout capture, source
+events, memory + embeddings) are exercised without network or API cost.
+
+    python loadtest.py --sessions 20 --concurrency 4 \
+        --llm-latency lognormal:2.0,0.5 --openalex-latency uniform:0.3,1.2
+
+Distributions: const:S | uniform:A,B | lognormal:MEDIAN,SIGMA | exp:MEAN (seconds).
+Prints one JSON object: throughput, queueing delay, end-to-end p50/p95,
+CPU, peak RSS and any cross-session interference in the source summaries
+(foreign OpenAlex queries or extra tool hits, not legitimate cache reuse).
+"""
+import argparse
+import json
+import random
+import re
+import resource
+import sys
+import time
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from benchmark import percentile, peak_rss_mb
+
+
+def parse_distribution(spec):
+    """'lognormal:2.0,0.5' -> zero-arg sampler returning seconds."""
+    kind, _, params = spec.partition(":")
+    args = [float(x) for x in params.split(",") if x]
+    samplers = {
+        "const": lambda: args[0],
+        "uniform": lambda: random.uniform(args[0], args[1]),
+        "lognormal": lambda: random.lognormvariate(0, args[1]) * args[0],
+        "exp": lambda: random.expovariate(1 / args[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown distribution: {spec}")
+    return samplers[kind]
+
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+def install_stubs(llm_latency, openalex_latency, papers_per_query=5):
+    """Swap OpenAlex HTTP and the crews' LLM calls for local stand-ins (memory: see crew.cold_memory)."""
+    import requests
+    import crew
+    import tools
+
+    def fake_get(url, headers=None, timeout=None, **kwargs):
+        time.sleep(openalex_latency())
+        # Tag every title with the query so reports can be traced back to their session
+        query = url.split("search=", 1)[-1].split("&", 1)[0]
+        return _FakeResponse({"results": [
+            {
+                "id": f"https://openalex.org/W{uuid.uuid4().int % 10**9}",
+                "title": f"[{query}] Simulated paper {k}",
+                "publication_year": 2025,
+                "doi": None,
+                "authorships": [{"author": {"display_name": "Load Tester"}}],
+                "abstract_inverted_index": {"Simulated": [0], "abstract.": [1]},
+            }
+            for k in range(papers_per_query)
+        ]})
+
+    tools.requests = types.SimpleNamespace(get=fake_get, exceptions=requests.exceptions)
+
+    class FakeCrew:
+        def __init__(self, llm_stages, calls_tool):
+            self.llm_stages = llm_stages
+            self.calls_tool = calls_tool
+
+        def kickoff(self, inputs):
+            papers = inputs.get("papers", "")
+            for stage in range(self.llm_stages):
+                time.sleep(llm_latency())
+                if stage == 0 and self.calls_tool:
+                    papers = crew.search_openalex.run(inputs["topic"])
+            return f"# Report: {inputs['topic']}\n\n{papers}"
+
+    crew.build_research_crew = lambda topic: FakeCrew(llm_stages=3, calls_tool=True)  # Librarian, Critic, Scribe
+    crew.build_direct_crew = lambda: FakeCrew(llm_stages=2, calls_tool=False)          # Critic, Scribe
+
+
+def run_session(run_research, topic, direct, submitted_at):
+    """Consume one run_research generator the way Gradio would."""
+    started = time.perf_counter()
+    polls, final = 0, ""
+    for status, output in run_research(topic, direct):
+        polls += 1
+        final = output
+    done = time.perf_counter()
+    return {
+        "topic": topic,
+        "queue_s": started - submitted_at,
+        "run_s": done - started,
+        "e2e_s": done - submitted_at,
+        "polls": polls,
+        "output": final,
+    }
+
+
+def parse_source_summary(output):
+    """Per-session parts of the Gradio source summary: memory/web hit counts and OpenAlex queries."""
+    summary = output.split("### 📊 Data Source Summary", 1)[-1]
+    hits = lambda label: int((re.search(rf"{label}:\*\* Used (\d+) times", summary) or [0, 0])[1])
+    query_line = re.search(r"OpenAlex query used:\*\* (.*)", summary)
+    return {
+        "mem_hits": hits(re.escape("Local Memory (ChromaDB)")),
+        "web_hits": hits(re.escape("External API (OpenAlex)")),
+        "queries": re.findall(r'"([^"]*)"', query_line.group(1)) if query_line else [],
+    }
+
+
+def find_interference(results):
+    """
+    Sessions whose source summary reflects another session's tool calls:
+    an OpenAlex query for a foreign topic, or more search-tool hits than the
+    single call one session makes. Papers served from memory that another
+    session cached are legitimate reuse and are not flagged.
+    """
+    flagged = []
+    for r in results:
+        summary = parse_source_summary(r["output"])
+        foreign = sorted(q for q in set(summary["queries"]) if q != r["topic"])
+        hits = summary["mem_hits"] + summary["web_hits"]
+        if foreign or hits > 1:
+            flagged.append({"topic": r["topic"], "foreign_queries": foreign, "tool_hits": hits})
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test gradio_app.run_research with stubbed backends.")
+    parser.add_argument("--sessions", type=int, default=20, help="Total simulated sessions")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Sessions served at once (Gradio queue concurrency)")
+    parser.add_argument("--distinct-topics", type=int, default=0,
+                        help="Number of distinct topics (0 = one per session)")
+    parser.add_argument("--direct", action="store_true", help="Use the direct-tool pipeline mode")
+    parser.add_argument("--llm-latency", default="lognormal:1.0,0.4")
+    parser.add_argument("--openalex-latency", default="uniform:0.2,0.8")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    install_stubs(parse_distribution(args.llm_latency), parse_distribution(args.openalex_latency))
+    from gradio_app import run_research
+    from crew import cold_memory, crew_flight
+
+    n_topics = args.distinct_topics or args.sessions
+    run_id = uuid.uuid4().hex[:6]
+    topics = [f"loadtest-{run_id}-topic-{i % n_topics:04d}" for i in range(args.sessions)]
+
+    real_stdout = sys.stdout
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    # Keep simulated papers out of research_db (no shard writes, no replica reads either)
+    with cold_memory(), ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(run_session, run_research, t, args.direct, time.perf_counter()) for t in topics
+        ]
+        results, errors = [], []
+        for f in futures:
+            try:
+                results.append(f.result())
+            except Exception as e:
+                errors.append(repr(e))
+    wall = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    # Concurrent sessions swap sys.stdout under each other; make sure we print to the terminal
+    sys.stdout = real_stdout
+
+    cpu_s = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    e2e = [r["e2e_s"] for r in results]
+    queue = [r["queue_s"] for r in results]
+    interference = find_interference(results)
+
+    report = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "completed": len(results),
+        "errors": errors,
+        "wall_s": round(wall, 2),
+        "throughput_sessions_per_min": round(len(results) / wall * 60, 2) if wall else 0,
+        "queue_s_p50": round(percentile(queue, 50), 2) if queue else None,
+        "queue_s_p95": round(percentile(queue, 95), 2) if queue else None,
+        "e2e_s_p50": round(percentile(e2e, 50), 2) if e2e else None,
+        "e2e_s_p95": round(percentile(e2e, 95), 2) if e2e else None,
+        "avg_polls_per_session": round(sum(r["polls"] for r in results) / len(results), 1) if results else 0,
+        "cpu_s": round(cpu_s, 2),
+        "cpu_cores_avg": round(cpu_s / wall, 2) if wall else 0,
+        "peak_rss_mb": peak_rss_mb(),
+        "coalescing": crew_flight.stats(),
+        "interference_sessions": len(interference),
+        "interference": interference,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
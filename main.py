@@ -1,20 +1,30 @@
 #main.py
 import json
+import logging
 import re
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, NOT_GIVEN
 from tools import search_openalex_raw
 from memory import search_memory, save_papers_to_memory
+from compaction import compact_papers
+from singleflight import SingleFlight
+from citations import expand_citations, EXPAND_CITATIONS
+from budget import RunBudget
 
 load_dotenv()
 
 client = OpenAI()
+logger = logging.getLogger(__name__)
 
 MIN_PAPERS = 3
 MAX_RETRIES = 4
+# Scribe model when the run is short on time
+FAST_SCRIBE_MODEL = "gpt-4o-mini"
+# Never give an LLM / HTTP call less than this, even when the budget is nearly spent
+MIN_CALL_TIMEOUT_S = 10
 
 
-def chat_text(model, system, user, temperature=0):
+def chat_text(model, system, user, temperature=0, timeout=NOT_GIVEN):
     response = client.chat.completions.create(
         model=model,
         messages=[
@@ -22,11 +32,12 @@ def chat_text(model, system, user, temperature=0):
             {"role": "user", "content": user},
         ],
         temperature=temperature,
+        timeout=timeout,
     )
     return (response.choices[0].message.content or "").strip()
 
 
-def extract_keywords(topic, attempt):
+def extract_keywords(topic, attempt, timeout=NOT_GIVEN):
     system = "You generate compact academic search keywords."
     user = (
         f"Generate 3 to 5 concise keywords for: {topic}. "
@@ -34,7 +45,7 @@ def extract_keywords(topic, attempt):
     )
     if attempt > 0:
         user += " Focus on recent, high-impact, peer-reviewed work."
-    return chat_text("gpt-4o-mini", system, user, temperature=0)
+    return chat_text("gpt-4o-mini", system, user, temperature=0, timeout=timeout)
 
 
 def parse_cached_papers(mem_results):
@@ -45,7 +56,10 @@ def parse_cached_papers(mem_results):
         title = meta.get("title")
         year = meta.get("year")
         if title:
-            papers.append({"id": title, "title": title, "year": year})
+            papers.append({
+                "id": title, "title": title, "year": year,
+                "link": meta.get("link", ""), "openalex_id": meta.get("openalex_id", ""),
+            })
     if papers:
         return papers
 
@@ -58,7 +72,7 @@ def parse_cached_papers(mem_results):
             )
     return papers
 
-def run_critic(user_topic, papers):
+def run_critic(user_topic, papers, timeout=NOT_GIVEN):
     """
     Enhanced critic with scoring rubric and detailed feedback.
     Returns: {
@@ -106,7 +120,8 @@ Then summarize:
             {"role": "user", "content": user}
         ],
         temperature=0,
-        response_format={"type": "json_object"}
+        response_format={"type": "json_object"},
+        timeout=timeout,
     )
     
     result = json.loads(response.choices[0].message.content)
@@ -117,10 +132,43 @@ Then summarize:
     
     return result
 
-def run_scribe_agent(user_topic, validated_papers):
+def approved_count(critic_result):
+    """Number of approved papers in a run_critic result (0 for empty / missing)."""
+    if isinstance(critic_result, dict):
+        return len(critic_result.get("approved") or [])
+    return len(critic_result or [])
+
+def resolve_approved(critic_result, reviewed_papers):
+    """
+    Map the critic's approved entries (LLM JSON with paper_id / title) back to
+    the paper dicts it was shown, which carry link and openalex_id.
+    """
+    approved = (critic_result.get("approved") or []) if isinstance(critic_result, dict) else (critic_result or [])
+    norm = lambda v: str(v).strip().lower() if v else ""
+    by_key = {}
+    for paper in reviewed_papers:
+        for field in ("id", "title", "link", "openalex_id"):
+            if norm(paper.get(field)):
+                by_key.setdefault(norm(paper.get(field)), paper)
+    resolved = []
+    for entry in approved:
+        keys = [entry.get(f) for f in ("paper_id", "id", "title", "link")] if isinstance(entry, dict) else [entry]
+        match = next((by_key[norm(k)] for k in keys if norm(k) in by_key), None)
+        if match is not None and not any(match is r for r in resolved):
+            resolved.append(match)
+    return resolved
+
+def run_scribe_agent(user_topic, validated_papers, model="gpt-4o", timeout=NOT_GIVEN):
     """Synthesizes the final research report in Markdown."""
     print("✍️ Scribe is generating the professional report...")
     
+    # Trim abstracts to the most topic-relevant sentences within the token budget
+    if isinstance(validated_papers, dict) and "approved" in validated_papers:
+        approved, _ = compact_papers(user_topic, validated_papers["approved"])
+        validated_papers = {**validated_papers, "approved": approved}
+    elif isinstance(validated_papers, list):
+        validated_papers, _ = compact_papers(user_topic, validated_papers)
+    
     system = "You are a professional academic scribe. Write clear, structured Markdown."
     user = f"""
 Topic: {user_topic}
@@ -135,36 +183,92 @@ Task: Write a research summary in professional Markdown with:
 
 Format citations as (Author, Year) when possible.
 """
-    return chat_text("gpt-4o", system, user, temperature=0.2)
+    return chat_text(model, system, user, temperature=0.2, timeout=timeout)
+
+def run_research_pipeline(user_topic, budget_s=None):
+    """
+    Memory-first research pipeline under a per-run latency budget
+    (RESEARCH_BUDGET_S, or budget_s). Retries stop when another round no
+    longer fits, falling back to the best reviewed set (or to memory results
+    when there was no time to review them), and the scribe is downgraded when
+    short on time. The report ends with the stage
+    timings and shortcuts taken.
+    """
+    budget = RunBudget(budget_s) if budget_s is not None else RunBudget()
+    call_timeout = lambda: max(budget.remaining(), MIN_CALL_TIMEOUT_S)
 
-def run_research_pipeline(user_topic):
     # Phase 1: Memory-first search
     print(f"🧠 Checking local memory for: {user_topic}...")
-    mem_results = search_memory(user_topic)
-    cached_papers = parse_cached_papers(mem_results)
-    validated = run_critic(user_topic, cached_papers)
+    with budget.stage("memory"):
+        mem_results = search_memory(user_topic)
+    cached_papers = parse_cached_papers(mem_results or {})
+    validated = {}
+    unreviewed = []
+    reviewed_papers = list(cached_papers)  # everything shown to the critic, for resolve_approved
+    if cached_papers:
+        if budget.fits("critic", reserve=budget.estimate("scribe_fast")):
+            with budget.stage("critic"):
+                validated = run_critic(user_topic, cached_papers, timeout=call_timeout())
+        else:
+            budget.shortcut(f"skipped reviewing {len(cached_papers)} memory result(s) — no time for the critic")
+            unreviewed = cached_papers
 
-    if len(validated) < MIN_PAPERS:
+    # Phase 2: Web search with retries, while another round fits the budget
+    if approved_count(validated) < MIN_PAPERS:
         print("🌐 Searching the web (OpenAlex)...")
-        validated = []
+        best = validated
         for attempt in range(MAX_RETRIES + 1):
-            keywords = extract_keywords(user_topic, attempt)
-            raw_web_results = search_openalex_raw(keywords, per_page=5)
+            if not budget.fits("keywords", "openalex", "critic", reserve=budget.estimate("scribe_fast")):
+                budget.shortcut(
+                    f"stopped OpenAlex retries after {attempt} round(s) — "
+                    f"{budget.remaining():.0f}s left could not fit another round"
+                )
+                break
+            with budget.stage("keywords"):
+                keywords = extract_keywords(user_topic, attempt, timeout=call_timeout())
+            with budget.stage("openalex"):
+                raw_web_results = search_openalex_raw(keywords, per_page=5, timeout=min(15, call_timeout()))
             if isinstance(raw_web_results, dict) and raw_web_results.get("error"):
                 print(f"OpenAlex error: {raw_web_results['error']}")
                 continue
             if not raw_web_results:
                 continue
             save_papers_to_memory(raw_web_results, user_topic)
-            validated = run_critic(user_topic, raw_web_results)
-            if len(validated) >= MIN_PAPERS:
+            reviewed_papers += raw_web_results
+            with budget.stage("critic"):
+                result = run_critic(user_topic, raw_web_results, timeout=call_timeout())
+            if approved_count(result) > approved_count(best):
+                best = result
+            if approved_count(result) >= MIN_PAPERS:
                 break
+        if approved_count(best) < MIN_PAPERS and approved_count(best) > 0:
+            budget.shortcut(f"using best reviewed set ({approved_count(best)} < {MIN_PAPERS} papers)")
+        validated = best
+
+    if not approved_count(validated):
+        # Never write from papers the critic rejected; memory results are only
+        # used as-is when there was no time to review them at all
+        if not unreviewed:
+            return "No high-quality papers found.\n\n---\n" + budget.summary_markdown()
+        budget.shortcut("no time to review papers — falling back to unreviewed memory results")
+        validated = {"approved": unreviewed, "rejected": [], "stats": {"source": "memory-only (unreviewed)"}}
+
+    if EXPAND_CITATIONS:
+        if budget.fits("citations", "scribe"):
+            with budget.stage("citations"):
+                expand_citations(resolve_approved(validated, reviewed_papers), user_topic)
+        else:
+            budget.shortcut("skipped citation expansion")
 
-    if not validated:
-        return "No high-quality papers found."
+    # Phase 3: Scribe synthesis (downgrade the model if the full scribe won't fit)
+    scribe_model = "gpt-4o"
+    if not budget.fits("scribe"):
+        scribe_model = FAST_SCRIBE_MODEL
+        budget.shortcut(f"scribe downgraded to {FAST_SCRIBE_MODEL} ({budget.remaining():.0f}s left)")
+    with budget.stage("scribe_fast" if scribe_model == FAST_SCRIBE_MODEL else "scribe"):
+        report = run_scribe_agent(user_topic, validated, model=scribe_model, timeout=call_timeout())
 
-    # Phase 3: Scribe synthesis
-    report = run_scribe_agent(user_topic, validated)
+    report = f"{report}\n\n---\n{budget.summary_markdown()}"
     
     # Save the report to a file
     with open("research_report.md", "w", encoding="utf-8") as f:
@@ -173,6 +277,14 @@ def run_research_pipeline(user_topic):
     print("✅ Report saved to 'research_report.md'")
     return report
 
+# Concurrent requests for the same topic share one pipeline run
+pipeline_flight = SingleFlight()
+
+
+def run_research_pipeline_coalesced(user_topic):
+    """run_research_pipeline behind the single-flight layer (see pipeline_flight.stats())."""
+    return pipeline_flight.do(user_topic, lambda: run_research_pipeline(user_topic))
+
 if __name__ == "__main__":
     topic = "AI Agents in Software Engineering 2026"
     print(run_research_pipeline(topic))
\ No newline at end of file
@@ -0,0 +1,180 @@
+# maintenance.py
+"""
+Health report and index maintenance for research_db.
+
+    python maintenance.py report [--probe-queries 20] [--repeats 5]
+    python maintenance.py vacuum
+    python maintenance.py rebuild
+
+Every command prints one JSON object so the output can feed alerting.
+vacuum rewrites the SQLite file: run it while no app is writing.
+rebuild deletes and recreates every collection: no app (Gradio, main.py,
+crew.py, replica export) may be running, because their open collection
+handles, including sharding's cached ones, point at the deleted IDs and
+break for reads as well as writes. Restart them afterwards.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import statistics
+import time
+from benchmark import percentile
+from memory import client, local_ef, all_collections, search_memory, MEMORY_READ_BACKEND, MEMORY_SHARDING
+
+DB_PATH = "./research_db"
+SQLITE_FILE = os.path.join(DB_PATH, "chroma.sqlite3")
+REBUILD_BATCH_SIZE = 256
+
+
+def _dir_size_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return round(total / (1024 * 1024), 2)
+
+
+def _normalize_title(title):
+    return " ".join(re.sub(r"[^\w\s]", " ", (title or "").lower()).split())
+
+
+def store_stats():
+    """Row count, duplicate rate, topic cardinality and document sizes."""
+    rows, titles, topics, doc_sizes, abstract_sizes = 0, {}, set(), [], []
+    per_collection = {}
+    for col in all_collections():
+        data = col.get(include=["documents", "metadatas"])
+        ids = data.get("ids") or []
+        per_collection[col.name] = len(ids)
+        rows += len(ids)
+        for doc, meta in zip(data.get("documents") or [], data.get("metadatas") or []):
+            meta = meta or {}
+            doc_sizes.append(len(doc or ""))
+            abstract_sizes.append(len(meta.get("abstract") or ""))
+            if meta.get("topic"):
+                topics.add(meta["topic"].strip().lower())
+            key = _normalize_title(meta.get("title")) or meta.get("link")
+            if key:
+                titles[key] = titles.get(key, 0) + 1
+
+    # IDs are str(hash(title)), and hash() is salted per process, so the same
+    # paper saved from two processes shows up as two rows
+    duplicate_rows = sum(n - 1 for n in titles.values() if n > 1)
+    return {
+        "rows": rows,
+        "collections": per_collection,
+        "unique_papers": len(titles),
+        "duplicate_rows": duplicate_rows,
+        "duplicate_rate": round(duplicate_rows / rows, 4) if rows else 0.0,
+        "topic_cardinality": len(topics),
+        "avg_document_chars": round(statistics.mean(doc_sizes), 1) if doc_sizes else 0,
+        "avg_abstract_chars": round(statistics.mean(abstract_sizes), 1) if abstract_sizes else 0,
+        "disk_mb": _dir_size_mb(DB_PATH),
+        "topics": sorted(topics),
+    }
+
+
+def latency_probe(queries, repeats=5, n_results=3):
+    """Time search_memory over the recorded queries; percentiles in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        for q in queries:
+            start = time.perf_counter()
+            search_memory(q, n_results=n_results, max_retries=1)
+            timings.append((time.perf_counter() - start) * 1000)
+    if not timings:
+        return {"queries": 0}
+    return {
+        "backend": "sharded" if MEMORY_SHARDING else MEMORY_READ_BACKEND,
+        "queries": len(queries),
+        "samples": len(timings),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "max_ms": round(max(timings), 2),
+    }
+
+
+def vacuum():
+    """VACUUM + ANALYZE the Chroma SQLite file; reports size before / after."""
+    before = _dir_size_mb(DB_PATH)
+    conn = sqlite3.connect(SQLITE_FILE)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return {"action": "vacuum", "disk_mb_before": before, "disk_mb_after": _dir_size_mb(DB_PATH)}
+
+
+def rebuild():
+    """
+    Rebuild each collection's HNSW index from scratch (drops tombstoned
+    entries left by deletes/upserts). Rows are staged in a temporary
+    collection first so a crash never loses data. Stop every app first:
+    the collections get new IDs, so handles held elsewhere stop working.
+    """
+    rebuilt = {}
+    for col in all_collections():
+        name = col.name
+        data = col.get(include=["embeddings", "documents", "metadatas"])
+        ids = data.get("ids") or []
+
+        staging = client.get_or_create_collection(name=f"{name}__rebuild", embedding_function=local_ef)
+        _copy(data, staging)
+        client.delete_collection(name)
+        fresh = client.get_or_create_collection(name=name, embedding_function=local_ef, metadata=col.metadata)
+        _copy(staging.get(include=["embeddings", "documents", "metadatas"]), fresh)
+        client.delete_collection(staging.name)
+        rebuilt[name] = len(ids)
+    return {"action": "rebuild", "collections": rebuilt}
+
+
+def _copy(data, target):
+    ids = data.get("ids") or []
+    for i in range(0, len(ids), REBUILD_BATCH_SIZE):
+        target.upsert(
+            ids=ids[i:i + REBUILD_BATCH_SIZE],
+            embeddings=list(data["embeddings"][i:i + REBUILD_BATCH_SIZE]),
+            documents=data["documents"][i:i + REBUILD_BATCH_SIZE],
+            metadatas=data["metadatas"][i:i + REBUILD_BATCH_SIZE],
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="research_db health report and maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="Store statistics and query-latency probe")
+    rep.add_argument("--probe-queries", type=int, default=20,
+                     help="Number of recorded queries (stored topics) to replay")
+    rep.add_argument("--queries-file", help="Replay queries from a file, one per line")
+    rep.add_argument("--repeats", type=int, default=5)
+    sub.add_parser("vacuum", help="VACUUM the SQLite file")
+    sub.add_parser("rebuild", help="Rebuild the HNSW index of every collection (stop all apps first)")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        stats = store_stats()
+        if args.queries_file:
+            with open(args.queries_file, "r", encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+        else:
+            # Stored topics are the queries users actually ran
+            queries = stats["topics"]
+        result = {**stats, "latency": latency_probe(queries[:args.probe_queries], repeats=args.repeats)}
+        result.pop("topics")
+    elif args.command == "vacuum":
+        result = vacuum()
+    else:
+        result = rebuild()
+    result["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
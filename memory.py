@@ -4,22 +4,65 @@ import os
 import time
 import chromadb
 import numpy as np
-from chromadb.utils import embedding_functions
+from embeddings import get_embedding_function, read_backend_marker, EMBEDDING_BACKEND
 
 # 1. Setup Local Embeddings (Free & Fast)
-local_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
-)
+# Backend is chosen by EMBEDDING_BACKEND (sentence-transformers | onnx | onnx-int8)
+local_ef = get_embedding_function()
 
-# 2. Setup ChromaDB
-# This saves the database to a folder named "research_db"
-client = chromadb.PersistentClient(path="./research_db")
+# "chroma" (default) or "replica" (read-only mmapped snapshot, see replica.py)
+MEMORY_READ_BACKEND = os.getenv("MEMORY_READ_BACKEND", "chroma")
+COLLECTION_NAME = "openai_research_vault"
 
-# 3. Get or Create Collection
-collection = client.get_or_create_collection(
-    name="openai_research_vault", 
-    embedding_function=local_ef
-)
+
+def _open_chroma():
+    """Open research_db and the main collection (sets module-level client / collection)."""
+    global client, collection
+    # 2. Setup ChromaDB
+    # This saves the database to a folder named "research_db"
+    client = chromadb.PersistentClient(path="./research_db")
+
+    # 3. Get or Create Collection
+    collection = client.get_or_create_collection(
+        name=COLLECTION_NAME, 
+        embedding_function=local_ef
+    )
+
+    if read_backend_marker() != EMBEDDING_BACKEND and collection.count() > 0:
+        logging.getLogger(__name__).warning(
+            f"Stored vectors were embedded with {read_backend_marker()}, running {EMBEDDING_BACKEND}; "
+            f"run `python embeddings.py {EMBEDDING_BACKEND}` to check/migrate."
+        )
+
+
+def __getattr__(name):
+    # Replica readers open Chroma only on first write / fallback (PEP 562 lazy attribute)
+    if name in ("client", "collection"):
+        _open_chroma()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_collection():
+    """The main collection, opening research_db on first use."""
+    if "collection" not in globals():
+        _open_chroma()
+    return globals()["collection"]
+
+
+if MEMORY_READ_BACKEND != "replica":
+    _open_chroma()
+
+# Split memory into per-domain shard collections (see sharding.py)
+MEMORY_SHARDING = os.getenv("MEMORY_SHARDING", "0") == "1"
+
+
+def all_collections():
+    """Every collection that holds papers (the main one plus shards when enabled)."""
+    if not MEMORY_SHARDING:
+        return [get_collection()]
+    from sharding import shard_router  # lazy: sharding imports this module
+    return shard_router.collections() + [get_collection()]
 
 # Max abstract length for storage (ChromaDB metadata + embedding doc)
 # 8000 chars allows full abstracts including long structured ones
@@ -44,18 +87,43 @@ def save_papers_to_memory(papers, topic):
             "author": p.get("author", "") or "",
             "link": p.get("link", "") or "",
             "abstract": abstract_snippet(p.get("abstract")),
+            "openalex_id": p.get("openalex_id", "") or "",
         }
         for p in papers
     ]
     
-    collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+    if MEMORY_SHARDING:
+        from sharding import shard_router
+        shard_router.save(ids, documents, metadatas)
+    else:
+        get_collection().upsert(ids=ids, documents=documents, metadatas=metadatas)
     print(f"💾 Saved {len(papers)} papers to local memory.")
 
+
+def find_known_works(values):
+    """Return the subset of OpenAlex IDs / links already stored in memory."""
+    values = [v for v in dict.fromkeys(values) if v]
+    if not values:
+        return set()
+    known = set()
+    for col in all_collections():
+        for field in ("openalex_id", "link"):
+            found = col.get(where={field: {"$in": values}}, include=["metadatas"])
+            known.update(m.get(field) for m in found.get("metadatas") or [] if m)
+    return known & set(values)
+
 logger = logging.getLogger(__name__)
 
 # Min cosine similarity (0-1) for current query to match stored topic
 TOPIC_MATCH_SIMILARITY_THRESHOLD = 0.95
 
+def cosine_similarity(a, b):
+    """Cosine similarity between two embedding vectors."""
+    a = np.array(a, dtype=float)
+    b = np.array(b, dtype=float)
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9))
+
+
 def query_matches_stored_topics(query, metadatas, threshold=TOPIC_MATCH_SIMILARITY_THRESHOLD):
     """Return True if current query semantically matches any stored topic."""
     if not metadatas:
@@ -67,11 +135,8 @@ def query_matches_stored_topics(query, metadatas, threshold=TOPIC_MATCH_SIMILARI
     try:
         query_embs = local_ef([query])
         topic_embs = local_ef(topics)
-        q = np.array(query_embs[0], dtype=float)
         for te in topic_embs:
-            t = np.array(te, dtype=float)
-            sim = np.dot(q, t) / (np.linalg.norm(q) * np.linalg.norm(t) + 1e-9)
-            if sim >= threshold:
+            if cosine_similarity(query_embs[0], te) >= threshold:
                 return True
     except Exception as e:
         logger.warning(f"Topic match check failed: {e}")
@@ -82,11 +147,15 @@ def query_matches_stored_topics(query, metadatas, threshold=TOPIC_MATCH_SIMILARI
 def flush_memory():
     """Delete all papers from the ChromaDB collection."""
     try:
-        ids = collection.get()["ids"]
-        if ids:
-            collection.delete(ids=ids)
-            print(f"🗑️ Flushed {len(ids)} papers from local memory.")
-            return len(ids)
+        total = 0
+        for col in all_collections():
+            ids = col.get()["ids"]
+            if ids:
+                col.delete(ids=ids)
+                total += len(ids)
+        if total:
+            print(f"🗑️ Flushed {total} papers from local memory.")
+            return total
         print("🗑️ Memory already empty.")
         return 0
     except Exception as e:
@@ -96,9 +165,24 @@ def flush_memory():
 
 def search_memory(query, n_results=3, max_retries=3):
     """Search memory with retry logic and error handling."""
+    if MEMORY_READ_BACKEND == "replica":
+        from replica import replica_search  # lazy: replica imports this module
+        try:
+            results = replica_search.query(query, n_results=n_results)
+            if results is not None:
+                return results
+            logger.warning("No memory replica published yet — falling back to Chroma.")
+        except Exception as e:
+            logger.error(f"Replica search failed, falling back to Chroma: {e}")
+
     for attempt in range(max_retries):
         try:
-            results = collection.query(
+            if MEMORY_SHARDING:
+                from sharding import shard_router
+                shard_router.refresh()
+                if shard_router.shards:
+                    return shard_router.query(query, n_results=n_results)
+            results = get_collection().query(
                 query_texts=[query],
                 n_results=n_results,
                 include=["documents", "metadatas", "distances"],
@@ -0,0 +1,163 @@
+# replica.py
+"""
+Read-only, memory-mapped replica of the research_db vector store.
+The export job snapshots embeddings, IDs and lean metadata out of Chroma into
+versioned .npy / .jsonl files and flips a CURRENT pointer atomically.
+Abstracts go into a single UTF-8 blob addressed by an offsets array, so only
+the top-k results are ever decoded. Any number of processes can then serve
+search_memory from the same mmapped files (the OS page cache is shared)
+while writes keep going to Chroma. With MEMORY_READ_BACKEND=replica,
+memory.py does not open research_db until a write or a fallback needs it.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from collections import namedtuple
+import numpy as np
+from memory import all_collections, local_ef
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DIR = os.getenv("MEMORY_REPLICA_DIR", "./research_replica")
+CURRENT_FILE = "CURRENT"
+# Old snapshots kept around so readers that still map them are not disturbed
+KEEP_SNAPSHOTS = 2
+# Lean metadata parsed per process; abstracts live in the mmapped blob instead
+REPLICA_FIELDS = ("topic", "title", "year", "author", "link", "openalex_id")
+
+
+def export_replica(replica_dir=REPLICA_DIR):
+    """Snapshot the Chroma collection(s) into a new replica version. Returns its path."""
+    ids, vectors, metadatas = [], [], []
+    for col in all_collections():
+        data = col.get(include=["embeddings", "metadatas"])
+        if not data.get("ids"):
+            continue
+        ids += data["ids"]
+        vectors += list(data["embeddings"])
+        metadatas += data.get("metadatas") or [{}] * len(data["ids"])
+    embeddings = np.asarray(vectors, dtype=np.float32)
+    if embeddings.size == 0:
+        embeddings = embeddings.reshape(0, 0)
+
+    os.makedirs(replica_dir, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    tmp_dir = os.path.join(replica_dir, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "embeddings.npy"), embeddings)
+    np.save(os.path.join(tmp_dir, "sq_norms.npy"), np.einsum("ij,ij->i", embeddings, embeddings))
+    offsets = [0]
+    with open(os.path.join(tmp_dir, "records.jsonl"), "w", encoding="utf-8") as f, \
+            open(os.path.join(tmp_dir, "abstracts.bin"), "wb") as blob:
+        for id_, meta in zip(ids, metadatas):
+            lean = {k: (meta or {}).get(k, "") for k in REPLICA_FIELDS}
+            f.write(json.dumps({"id": id_, **lean}, ensure_ascii=False) + "\n")
+            encoded = ((meta or {}).get("abstract") or "").encode("utf-8")
+            blob.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+    np.save(os.path.join(tmp_dir, "abstract_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    # Publish: rename the finished snapshot, then atomically swap the pointer
+    os.replace(tmp_dir, os.path.join(replica_dir, version))
+    pointer_tmp = os.path.join(replica_dir, f".{CURRENT_FILE}.tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(replica_dir, CURRENT_FILE))
+
+    _prune(replica_dir)
+    print(f"📦 Exported {len(ids)} papers to replica {version}.")
+    return os.path.join(replica_dir, version)
+
+
+def _prune(replica_dir):
+    versions = sorted(d for d in os.listdir(replica_dir) if d.startswith("v"))
+    for old in versions[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(os.path.join(replica_dir, old), ignore_errors=True)
+
+
+# One published version, swapped in as a single reference so readers never mix versions
+_Snapshot = namedtuple("_Snapshot", "version embeddings sq_norms records abstracts abstract_offsets")
+
+
+class ReplicaSearch:
+    """Brute-force L2 search over the mmapped snapshot (same distances as Chroma's default space)."""
+
+    def __init__(self, replica_dir=REPLICA_DIR):
+        self.replica_dir = replica_dir
+        self.snapshot = None
+
+    def _current_version(self):
+        try:
+            with open(os.path.join(self.replica_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Map the latest published snapshot if it changed. Returns it, or None if none exists."""
+        version = self._current_version()
+        if version is None:
+            return None
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        path = os.path.join(self.replica_dir, version)
+        embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        sq_norms = np.load(os.path.join(path, "sq_norms.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(path, "abstract_offsets.npy"), mmap_mode="r")
+        blob_path = os.path.join(path, "abstracts.bin")
+        # np.memmap can't map an empty file
+        abstracts = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else b""
+        with open(os.path.join(path, "records.jsonl"), "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        snapshot = _Snapshot(version, embeddings, sq_norms, records, abstracts, offsets)
+        self.snapshot = snapshot
+        logger.info(f"Mapped memory replica {version} ({len(records)} papers)")
+        return snapshot
+
+    def query(self, query, n_results=3):
+        """Chroma-shaped results for a single query text, or None if no replica is published."""
+        # Read the snapshot once; a concurrent refresh swaps in a new one without touching it
+        snap = self.refresh()
+        if snap is None:
+            return None
+        empty = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        if not snap.records:
+            return empty
+        q = np.asarray(local_ef([query])[0], dtype=np.float32)
+        distances = snap.sq_norms - 2.0 * (snap.embeddings @ q) + float(q @ q)
+        k = min(n_results, len(snap.records))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+
+        ids, documents, metadatas = [], [], []
+        for i in top:
+            record = dict(snap.records[i])
+            start, end = int(snap.abstract_offsets[i]), int(snap.abstract_offsets[i + 1])
+            record["abstract"] = bytes(snap.abstracts[start:end]).decode("utf-8")
+            ids.append(record.pop("id"))
+            documents.append(f"{record['title']} ({record['year']}) {record['abstract']}".strip())
+            metadatas.append(record)
+        return {
+            "ids": [ids],
+            "documents": [documents],
+            "metadatas": [metadatas],
+            "distances": [[float(distances[i]) for i in top]],
+        }
+
+
+replica_search = ReplicaSearch()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the memory replica.")
+    parser.add_argument("--every", type=float, default=0, help="Re-export every N seconds (0 = once)")
+    args = parser.parse_args()
+    while True:
+        export_replica()
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
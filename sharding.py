@@ -0,0 +1,306 @@
+# sharding.py
+"""
+Domain-sharded memory collections. Papers are spread over several Chroma
+collections, one per research domain / topic cluster, each summarised by a
+centroid of its document embeddings. A query is embedded once and only the
+closest one or two shards are searched; writes are routed the same way.
+
+Enable with MEMORY_SHARDING=1, then split the existing collection with
+    python sharding.py rebalance --shards 4
+
+shards.json is shared by every process: readers re-load it when it changes
+(like replica.py's CURRENT pointer), and writers hold an exclusive file lock
+while they re-read, update and rewrite it.
+"""
+import argparse
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+from memory import client, collection, local_ef, COLLECTION_NAME
+
+logger = logging.getLogger(__name__)
+
+SHARD_REGISTRY = os.path.join("./research_db", "shards.json")
+# Search the best shard, plus the runner-up when its centroid is nearly as close
+SHARD_ROUTE_TOP_K = 2
+SHARD_ROUTE_MARGIN = 0.05
+# A write below this centroid similarity opens a new shard (up to MAX_SHARDS)
+SHARD_NEW_THRESHOLD = 0.35
+MAX_SHARDS = int(os.getenv("MEMORY_MAX_SHARDS", "8"))
+
+# Re-entrant: save() holds it while routing, which reads the registry too
+_lock = threading.RLock()
+_FILE_LOCK_SUFFIX = ".lock"
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=float)
+    return v / (np.linalg.norm(v) + 1e-9)
+
+
+class ShardRouter:
+    """Registry of shard collections and their centroids (persisted to shards.json)."""
+
+    def __init__(self, registry_path=SHARD_REGISTRY):
+        self.registry_path = registry_path
+        self.generation = 0
+        self.shards = {}  # name -> {"centroid": [...], "count": n}
+        self.query_hits = {}
+        self._collections = {}
+        self._mtime = None
+        self._load()
+
+    # --- registry ---
+    def _registry_mtime(self):
+        try:
+            return os.stat(self.registry_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        with _lock:
+            self._mtime = self._registry_mtime()
+            try:
+                with open(self.registry_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.generation = data.get("generation", 0)
+                self.shards = data.get("shards", {})
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.generation, self.shards = 0, {}
+            # Handles of shards dropped by a rebalance point at deleted collections
+            for name in set(self._collections) - set(self.shards):
+                self._collections.pop(name, None)
+
+    def refresh(self):
+        """Re-load shards.json if another process (or a rebalance) rewrote it."""
+        with _lock:
+            if self._registry_mtime() != self._mtime:
+                self._load()
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive registry access across threads and processes, on the latest copy."""
+        with _lock:
+            os.makedirs(os.path.dirname(self.registry_path), exist_ok=True)
+            with open(self.registry_path + _FILE_LOCK_SUFFIX, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self.refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        """Write the registry; callers hold _locked() so no other writer's update is lost."""
+        os.makedirs(os.path.dirname(self.registry_path), exist_ok=True)
+        tmp = self.registry_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"generation": self.generation, "shards": self.shards}, f)
+        os.replace(tmp, self.registry_path)
+        self._mtime = self._registry_mtime()
+
+    def collection(self, name):
+        if name not in self._collections:
+            self._collections[name] = client.get_or_create_collection(name=name, embedding_function=local_ef)
+        return self._collections[name]
+
+    def _new_shard_name(self):
+        return f"{COLLECTION_NAME}__g{self.generation}_s{len(self.shards)}"
+
+    # --- routing ---
+    def _snapshot(self):
+        """Consistent, up-to-date copy of the registry (save() / rebalance() mutate it under _lock)."""
+        with _lock:
+            self.refresh()
+            return {name: dict(s) for name, s in self.shards.items()}
+
+    def _ranked(self, embedding):
+        q = _unit(embedding)
+        sims = [(float(_unit(s["centroid"]) @ q), name) for name, s in self._snapshot().items()]
+        return sorted(sims, reverse=True)
+
+    def route_query(self, embedding, top_k=SHARD_ROUTE_TOP_K):
+        """Names of the shards to search for a query embedding."""
+        ranked = self._ranked(embedding)
+        if not ranked:
+            return []
+        best = ranked[0][0]
+        return [name for sim, name in ranked[:top_k] if sim >= best - SHARD_ROUTE_MARGIN]
+
+    def route_write(self, embedding):
+        """Shard a document goes to; opens a new shard for an unseen domain."""
+        ranked = self._ranked(embedding)
+        if ranked and (ranked[0][0] >= SHARD_NEW_THRESHOLD or len(self.shards) >= MAX_SHARDS):
+            return ranked[0][1]
+        name = self._new_shard_name()
+        self.shards[name] = {"centroid": _unit(embedding).tolist(), "count": 0}
+        return name
+
+    # --- read / write ---
+    def save(self, ids, documents, metadatas):
+        """Embed once, route each paper to its shard and upsert there."""
+        embeddings = local_ef(documents)
+        with self._locked():
+            groups = {}
+            for i, emb in enumerate(embeddings):
+                name = self.route_write(emb)
+                groups.setdefault(name, []).append(i)
+                shard = self.shards[name]
+                # Running mean of unit document vectors
+                n = shard["count"]
+                shard["centroid"] = ((np.asarray(shard["centroid"]) * n + _unit(emb)) / (n + 1)).tolist()
+                shard["count"] = n + 1
+            for name, idx in groups.items():
+                self.collection(name).upsert(
+                    ids=[ids[i] for i in idx],
+                    embeddings=[embeddings[i] for i in idx],
+                    documents=[documents[i] for i in idx],
+                    metadatas=[metadatas[i] for i in idx],
+                )
+            self._save()
+        return {name: len(idx) for name, idx in groups.items()}
+
+    def query(self, query, n_results=3):
+        """Chroma-shaped results merged across the routed shards."""
+        q = local_ef([query])[0]
+        names = self.route_query(q)
+        merged = []
+        # Papers not yet rebalanced out of the legacy collection stay searchable
+        sources = [(name, self.collection(name)) for name in names]
+        if collection.count() > 0:
+            sources.append((COLLECTION_NAME, collection))
+        for name, col in sources:
+            self.query_hits[name] = self.query_hits.get(name, 0) + 1
+            try:
+                res = col.query(
+                    query_embeddings=[q], n_results=n_results,
+                    include=["documents", "metadatas", "distances"],
+                )
+            except Exception as e:
+                # e.g. deleted by a rebalance in another process after we routed
+                logger.warning(f"Skipping shard {name}: {e}")
+                self._collections.pop(name, None)
+                continue
+            merged += zip(res["distances"][0], res["ids"][0], res["documents"][0], res["metadatas"][0])
+        merged = sorted(merged, key=lambda r: r[0])[:n_results]
+        return {
+            "ids": [[r[1] for r in merged]],
+            "documents": [[r[2] for r in merged]],
+            "metadatas": [[r[3] for r in merged]],
+            "distances": [[r[0] for r in merged]],
+            "shards": names,
+        }
+
+    def collections(self):
+        return [self.collection(name) for name in self._snapshot()]
+
+    # --- maintenance ---
+    def stats(self):
+        """Per-shard row counts, registry counts and in-process query hits."""
+        return {
+            name: {
+                "rows": self.collection(name).count(),
+                "registered": s["count"],
+                "query_hits": self.query_hits.get(name, 0),
+            }
+            for name, s in self._snapshot().items()
+        }
+
+    def recompute_centroids(self):
+        """Recompute every centroid from the stored vectors (e.g. after a re-embed)."""
+        with self._locked():
+            for name, shard in self.shards.items():
+                embs = self.collection(name).get(include=["embeddings"]).get("embeddings")
+                if embs is not None and len(embs):
+                    shard["centroid"] = _unit(np.mean([_unit(e) for e in embs], axis=0)).tolist()
+                    shard["count"] = len(embs)
+            self._save()
+
+    def rebalance(self, n_shards, iterations=20, seed=0):
+        """
+        Re-cluster every stored paper (shards plus the legacy single collection)
+        with spherical k-means into n_shards new collections, then drop the old ones.
+        Running processes pick up the new registry on their next query.
+        """
+        with self._locked():
+            sources = self.collections() + [collection]
+            ids, embs, docs, metas = [], [], [], []
+            for col in sources:
+                data = col.get(include=["embeddings", "documents", "metadatas"])
+                if not data.get("ids"):
+                    continue
+                ids += data["ids"]
+                embs += list(data["embeddings"])
+                docs += data["documents"]
+                metas += data["metadatas"]
+            if not ids:
+                print("🧩 Nothing to rebalance.")
+                return {}
+
+            # Same hash-based id can live in several sources; keep the last copy
+            latest = {id_: i for i, id_ in enumerate(ids)}
+            keep = sorted(latest.values())
+            ids, docs, metas = [ids[i] for i in keep], [docs[i] for i in keep], [metas[i] for i in keep]
+            X = np.array([_unit(embs[i]) for i in keep])
+            labels, centroids = _spherical_kmeans(X, min(n_shards, len(ids)), iterations, seed)
+
+            old_names = list(self.shards)
+            self.generation += 1
+            self.shards = {}
+            for k, centroid in enumerate(centroids):
+                idx = np.flatnonzero(labels == k)
+                if not len(idx):
+                    continue
+                name = self._new_shard_name()
+                self.shards[name] = {"centroid": centroid.tolist(), "count": int(len(idx))}
+                self.collection(name).upsert(
+                    ids=[ids[i] for i in idx],
+                    embeddings=[X[i].tolist() for i in idx],
+                    documents=[docs[i] for i in idx],
+                    metadatas=[metas[i] for i in idx],
+                )
+            self._save()
+
+            for name in old_names:
+                client.delete_collection(name)
+                self._collections.pop(name, None)
+            legacy_ids = collection.get()["ids"]
+            if legacy_ids:
+                collection.delete(ids=legacy_ids)
+
+        print(f"🧩 Rebalanced {len(ids)} papers into {len(self.shards)} shards.")
+        return self.stats()
+
+
+def _spherical_kmeans(X, k, iterations, seed):
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), size=k, replace=False)]
+    labels = np.zeros(len(X), dtype=int)
+    for _ in range(iterations):
+        labels = np.argmax(X @ centroids.T, axis=1)
+        for j in range(k):
+            members = X[labels == j]
+            if len(members):
+                centroids[j] = _unit(members.mean(axis=0))
+    return labels, centroids
+
+
+shard_router = ShardRouter()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage domain-sharded memory collections.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebalance", help="Re-cluster all papers into N shards")
+    rb.add_argument("--shards", type=int, default=4)
+    sub.add_parser("stats", help="Per-shard statistics")
+    args = parser.parse_args()
+
+    if args.command == "rebalance":
+        print(json.dumps(shard_router.rebalance(args.shards), indent=2))
+    else:
+        print(json.dumps(shard_router.stats(), indent=2))
@@ -0,0 +1,115 @@
+# singleflight.py
+"""
+Single-flight coalescing for research runs. Concurrent requests for the same
+normalized topic attach to one in-flight execution and all receive its result.
+Optional near-duplicate mode also attaches requests whose topic embedding is
+close enough to an in-flight topic (same idea as query_matches_stored_topics).
+"""
+import logging
+import os
+import threading
+from memory import local_ef, cosine_similarity, TOPIC_MATCH_SIMILARITY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate coalescing is off by default (embeds every incoming topic)
+NEAR_DUPLICATE_ENABLED = os.getenv("SINGLEFLIGHT_NEAR_DUPLICATE", "0") == "1"
+NEAR_DUPLICATE_THRESHOLD = float(
+    os.getenv("SINGLEFLIGHT_SIMILARITY_THRESHOLD", TOPIC_MATCH_SIMILARITY_THRESHOLD)
+)
+
+
+# Sentence punctuation trimmed from the ends of a topic; inner symbols are kept
+_EDGE_PUNCTUATION = ".,;:!?\"'` "
+
+
+def normalize_topic(topic):
+    """Lowercase, collapse whitespace and trim surrounding punctuation ("C++" != "C#" != "C")."""
+    return " ".join((topic or "").lower().split()).strip(_EDGE_PUNCTUATION)
+
+
+class _Call:
+    def __init__(self, topic, scope=None, embedding=None):
+        self.topic = topic
+        self.scope = scope
+        self.embedding = embedding
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs fn once per in-flight topic; concurrent callers share the result."""
+
+    def __init__(self, near_duplicate=NEAR_DUPLICATE_ENABLED, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.near_duplicate = near_duplicate
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"requests": 0, "executions": 0, "coalesced": 0, "coalesced_near_duplicate": 0}
+
+    def _embed(self, topic):
+        try:
+            return local_ef([topic])[0]
+        except Exception as e:
+            logger.warning(f"Topic embedding failed, exact-match coalescing only: {e}")
+            return None
+
+    def _find_similar(self, embedding, scope):
+        best, best_sim = None, self.threshold
+        for call in self._calls.values():
+            if call.embedding is None or call.scope != scope:
+                continue
+            sim = cosine_similarity(embedding, call.embedding)
+            if sim >= best_sim:
+                best, best_sim = call, sim
+        return best
+
+    def do(self, topic, fn, scope=None):
+        """
+        Run fn() for topic, or wait for the matching in-flight run and return its result.
+        Only runs with the same scope (e.g. pipeline mode) are coalesced.
+        """
+        key = (scope, normalize_topic(topic))
+        embedding = self._embed(topic) if self.near_duplicate else None
+
+        with self._lock:
+            self._stats["requests"] += 1
+            call = self._calls.get(key)
+            kind = "coalesced"
+            if call is None and embedding is not None:
+                call = self._find_similar(embedding, scope)
+                kind = "coalesced_near_duplicate"
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(topic, scope, embedding)
+                self._stats["executions"] += 1
+            else:
+                self._stats[kind] += 1
+
+        if not leader:
+            print(f"🔗 Attached to in-flight research for: {call.topic}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self):
+        """Counters plus the share of requests served by another run."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        coalesced = stats["coalesced"] + stats["coalesced_near_duplicate"]
+        stats["coalescing_rate"] = round(coalesced / stats["requests"], 3) if stats["requests"] else 0.0
+        return stats
@@ -0,0 +1,50 @@
+# test_singleflight.py
+import threading
+import time
+from singleflight import SingleFlight, normalize_topic
+
+
+def test_normalize_topic_keeps_inner_symbols():
+    keys = {normalize_topic(t) for t in ("C++ compilers", "C# compilers", "C compilers")}
+    assert len(keys) == 3
+
+
+def test_normalize_topic_case_whitespace_and_edges():
+    assert normalize_topic("  AI   Agents in SE? ") == "ai agents in se"
+    assert normalize_topic('"Graph neural networks."') == "graph neural networks"
+    assert normalize_topic(None) == ""
+
+
+def test_concurrent_same_topic_runs_once():
+    flight = SingleFlight(near_duplicate=False)
+    calls, release = [], threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "report"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda t=t: results.append(flight.do(t, work)))
+        for t in ("LLM agents", "llm  agents", "LLM agents.")
+    ]
+    for t in threads:
+        t.start()
+    while flight.stats()["requests"] < len(threads):
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == ["report"] * 3
+    assert flight.stats()["coalesced"] == 2
+
+
+def test_different_scope_or_symbols_not_coalesced():
+    flight = SingleFlight(near_duplicate=False)
+    assert flight.do("C++ compilers", lambda: "cpp", scope="agentic") == "cpp"
+    assert flight.do("C# compilers", lambda: "cs", scope="agentic") == "cs"
+    assert flight.do("C++ compilers", lambda: "direct", scope="direct") == "direct"
+    assert flight.stats()["executions"] == 3
@@ -23,6 +23,41 @@ def abstract_from_inverted_index(abstract_inverted_index):
     pairs.sort(key=lambda x: x[0])
     return " ".join(w for _, w in pairs)
 
+def search_openalex_raw(query, per_page=5, timeout=15):
+    """
+    Plain OpenAlex search (no memory, no agent formatting) for main.py.
+    Returns a list of paper dicts, or {"error": "..."} on request failure.
+    """
+    append_event("web")
+    append_event(["openalex_query", query])
+    encoded_search = quote((query or "").strip(), safe="")
+    url = f"https://api.openalex.org/works?search={encoded_search}&per-page={per_page}&select=title,publication_year,doi,id,authorships,abstract_inverted_index"
+    headers = {"User-Agent": "AI-Researcher/1.0 (mailto:your_email@example.com)"}
+    api_key = os.getenv("OPENALEX_API_KEY")
+    if api_key:
+        url += f"&mailto={api_key}"
+
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+    except requests.exceptions.RequestException as e:
+        return {"error": str(e)}
+
+    papers = []
+    for work in data.get("results", []):
+        authorships = work.get("authorships") or []
+        first = authorships[0] if authorships else {}
+        papers.append({
+            "title": work.get("title", "Unknown Title"),
+            "year": str(work.get("publication_year", "N/A")),
+            "author": (first.get("author") or {}).get("display_name", "") or "",
+            "link": work.get("doi") or work.get("id"),
+            "abstract": abstract_from_inverted_index(work.get("abstract_inverted_index") or {}),
+            "openalex_id": work.get("id") or "",
+        })
+    return papers
+
 @tool("OpenAlex Search")
 def search_openalex(query: str):
     """